@@ -44,7 +44,7 @@ class ClientMessage(BaseModel):
 
 
 class ServerMessage(BaseModel):
-    id: str = Field(pattern=r'[0-9]+\-[0-9]+')  # Redis stream ID
+    id: str = Field(pattern=r'^[0-9]+-[0-9]+$')  # Redis stream ID
     timestamp: int
     content: str
     user: User
@@ -1,13 +1,18 @@
 import pytest
 from typing import NamedTuple
-import random
-import string
+import secrets
 import requests
-from .api_types import CreateAccountRequest
+from http.cookiejar import DefaultCookiePolicy
 
 _port = 8080
 _api_base = f'http://localhost:{_port}/api'
 
+# All HTTP requests go through this session, so connections to the server
+# are kept alive and reused between requests. Cookies received in responses
+# are not stored, so every request only carries the cookies it sets explicitly.
+_http = requests.Session()
+_http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
 # General utilities
 def api_endpoint(ep: str)->str:
     ''' Returns the full URL of an API endpoint. '''
@@ -33,9 +38,10 @@ def check_status(res: requests.Response) -> requests.Response:
 def _gen_identifier() -> str:
     '''
     Generates a random identifier suitable to be inserted as username, email, etc.
-    This can be used to avoid email/username collisions between test runs
+    This can be used to avoid email/username collisions between test runs.
+    The result consists of 32 lowercase hex digits.
     '''
-    return ''.join(random.choices(string.ascii_lowercase, k=32))
+    return secrets.token_hex(16)
 
 def gen_username() -> str:
     ''' Generates a random, valid username. '''
@@ -46,6 +52,12 @@ def gen_email() -> str:
     return f'{_gen_identifier()}@test.com'
 
 
+# The HTTP session shared by all tests. Use this instead of requests.post and friends
+@pytest.fixture(scope="session")
+def http() -> requests.Session:
+    return _http
+
+
 # A generated user, with a valid session ID
 class GeneratedSession(NamedTuple):
     username: str
@@ -55,24 +67,32 @@ class GeneratedSession(NamedTuple):
 
 
 def _create_session() -> GeneratedSession:
-    unq = _gen_identifier()
-    data = CreateAccountRequest(username=gen_username(), email=gen_email(), password='Useruser10!')
-    res = check_status(requests.post(api_endpoint('create-account'), json=data.model_dump()))
+    # The request body is built by hand: validating it client-side is not the point here
+    username = gen_username()
+    email = gen_email()
+    password = 'Useruser10!'
+    res = check_status(_http.post(api_endpoint('create-account'), json={
+        'username': username,
+        'email': email,
+        'password': password,
+    }))
     return GeneratedSession(
-        username=data.username,
-        email=data.email,
-        password=data.password,
+        username=username,
+        email=email,
+        password=password,
         sid=res.cookies['sid']
     )
 
 
-# Creates a user and a session. This is run at most once per test run.
-@pytest.fixture(scope="module")
+# Creates a user and a session. This is run at most once per test run,
+# and the same user is shared by all test modules. Tests must not modify
+# the user or invalidate its session.
+@pytest.fixture(scope="session")
 def session():
     return _create_session()
 
 
 # Used for tests that require two different users.
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def session2():
     return _create_session()
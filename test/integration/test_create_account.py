@@ -1,6 +1,6 @@
 from .conftest import api_endpoint, GeneratedSession, gen_email, gen_username
 from .api_types import CreateAccountRequest, APIErrorResponse, ErrorId
-import requests
+from requests import Session
 import pytest
 
 
@@ -9,58 +9,66 @@ def test_success(session: GeneratedSession):
     assert session.sid != ''
 
 
-def test_duplicate_username(session: GeneratedSession):
+def test_duplicate_username(session: GeneratedSession, http: Session):
     req_data = CreateAccountRequest(email=gen_email(), username=session.username, password='Useruser10!')
-    res = requests.post(api_endpoint('create-account'), json=req_data.model_dump())
+    res = http.post(api_endpoint('create-account'), json=req_data.model_dump())
     assert res.status_code == 400
     res_data = APIErrorResponse.model_validate(res.json())
     assert res_data.id == ErrorId.UsernameExists
 
 
-def test_duplicate_email(session: GeneratedSession):
+def test_duplicate_email(session: GeneratedSession, http: Session):
     req_data = CreateAccountRequest(email=session.email, username=gen_username(), password='Useruser10!')
-    res = requests.post(api_endpoint('create-account'), json=req_data.model_dump())
+    res = http.post(api_endpoint('create-account'), json=req_data.model_dump())
     assert res.status_code == 400
     res_data = APIErrorResponse.model_validate(res.json())
     assert res_data.id == ErrorId.EmailExists
 
 
+# Valid field values, shared by the bad request cases below, so each case
+# only differs from a valid request in the field it tests
+_good_email = 'non-existing@test.com'
+_good_password = 'Useruser10!'
+_good_username = 'nonexisting-nickname'
+_too_long = 200*'a'
+
+
 @pytest.mark.parametrize("body", [
     # Empty
     {},
     # email: wrong type
-    { 'email': 10, 'password': 'Useruser10!', 'username': 'nonexisting-nickname' },
+    { 'email': 10, 'password': _good_password, 'username': _good_username },
     # email: empty
-    { 'email': '', 'password': 'Useruser10!', 'username': 'nonexisting-nickname'  },
+    { 'email': '', 'password': _good_password, 'username': _good_username  },
     # email: missing
-    { 'password': 'Useruser10!', 'username': 'nonexisting-nickname'  },
+    { 'password': _good_password, 'username': _good_username  },
     # email: too long
-    { 'email': 200*'a', 'password': 'Useruser10!', 'username': 'nonexisting-nickname'  },
+    { 'email': _too_long, 'password': _good_password, 'username': _good_username  },
     # email: bad format
-    { 'email': 'not-email', 'password': 'Useruser10!', 'username': 'nonexisting-nickname' },
+    { 'email': 'not-email', 'password': _good_password, 'username': _good_username },
     # pass: wrong type
-    { 'email': 'non-existing@test.com', 'password': 10, 'username': 'nonexisting-nickname' },    
+    { 'email': _good_email, 'password': 10, 'username': _good_username },    
     # pass: empty    
-    { 'email': 'non-existing@test.com', 'password': '', 'username': 'nonexisting-nickname' },     
+    { 'email': _good_email, 'password': '', 'username': _good_username },     
     # pass: too short   
-    { 'email': 'non-existing@test.com', 'password': 'short', 'username': 'nonexisting-nickname' },   
+    { 'email': _good_email, 'password': 'short', 'username': _good_username },   
     # pass: too long
-    { 'email': 'non-existing@test.com', 'password': 200*'a', 'username': 'nonexisting-nickname' },   
+    { 'email': _good_email, 'password': _too_long, 'username': _good_username },   
     # pass: missing
-    { 'email': 'non-existing@test.com', 'username': 'nonexisting-nickname' },   
+    { 'email': _good_email, 'username': _good_username },   
     # username: wrong type
-    { 'email': 'non-existing@test.com', 'password': 'Useruser10!', 'username': 10 },
+    { 'email': _good_email, 'password': _good_password, 'username': 10 },
     # username: empty
-    { 'email': 'non-existing@test.com', 'password': 'Useruser10!', 'username': ''  },
+    { 'email': _good_email, 'password': _good_password, 'username': ''  },
     # username: too short
-    { 'email': 'non-existing@test.com', 'password': 'Useruser10!', 'username': 'a'  },
+    { 'email': _good_email, 'password': _good_password, 'username': 'a'  },
     # username: missing
-    { 'email': 'non-existing@test.com', 'password': 'Useruser10!' },
+    { 'email': _good_email, 'password': _good_password },
     # username: too long
-    { 'email': 'non-existing@test.com', 'password': 'Useruser10!', 'username': 200*'a'  },
+    { 'email': _good_email, 'password': _good_password, 'username': _too_long  },
 ], ids=lambda x: str(x))
-def test_bad_request(body: dict):
-    res = requests.post(api_endpoint('create-account'), json=body)
+def test_bad_request(body: dict, http: Session):
+    res = http.post(api_endpoint('create-account'), json=body)
     assert res.status_code == 400
     res_data = APIErrorResponse.model_validate(res.json())
     assert res_data.id == ErrorId.BadRequest
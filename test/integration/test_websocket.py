@@ -1,6 +1,7 @@
 from websockets.sync.client import connect, ClientConnection
-from websockets.exceptions import ConnectionClosedError
-from contextlib import contextmanager
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
 from .api_types import (
     HelloEvent,
     ClientMessage,
@@ -8,7 +9,8 @@ from .api_types import (
     ClientMessagesEvent,
     ClientMessagesEventPayload,
 )
-from typing import Generator
+from typing import Generator, Tuple
+from pydantic import TypeAdapter
 from .conftest import ws_endpoint, GeneratedSession
 import pytest
 
@@ -20,22 +22,97 @@ import pytest
 # several times or with existent data.
 
 
-@contextmanager
-def _connect_websocket(sid: str) -> Generator[ClientConnection, None, None]:
-    ws = connect(ws_endpoint(), close_timeout=0.1, additional_headers={
+# Validators for the events we receive and serializer for the events we send,
+# built once at import time
+_hello_event = TypeAdapter(HelloEvent)
+_server_messages_event = TypeAdapter(ServerMessagesEvent)
+_client_messages_event = TypeAdapter(ClientMessagesEvent)
+
+# The rooms every user is subscribed to, as (id, name) pairs. Rooms are static,
+# so we know them in advance, but not the messages they've got
+_expected_rooms = [
+    ("beast", "Boost.Beast"),
+    ("async", "Boost.Async"),
+    ("db", "Database connectors"),
+    ("wasm", "Web assembly"),
+]
+
+
+def _serialize_client_message(room_id: str, content: str) -> bytes:
+    ''' Serializes a clientMessages event containing a single message. '''
+    return _client_messages_event.dump_json(ClientMessagesEvent(
+        type='clientMessages',
+        payload=ClientMessagesEventPayload(
+            roomId=room_id,
+            messages=[ClientMessage(content=content)]
+        )
+    ))
+
+
+# The events sent by the tests. Their content is constant, so they're serialized only once
+_wasm_message_1 = _serialize_client_message("wasm", "Test message 1")
+_wasm_message_2 = _serialize_client_message("wasm", "Test message 2")
+_beast_message_2 = _serialize_client_message("beast", "Test message 2")
+
+
+def _parse_stream_id(stream_id: str) -> Tuple[int, int]:
+    '''
+    Splits a Redis stream ID (as in message IDs) into its two numeric parts.
+    Stream IDs must be compared this way: comparing the strings is not
+    equivalent (e.g. '10-0' < '9-0').
+    '''
+    millis, seq = stream_id.split('-', 1)
+    return int(millis), int(seq)
+
+
+def _open_websocket(sid: str) -> ClientConnection:
+    return connect(ws_endpoint(), close_timeout=0.1, additional_headers={
         'Cookie': f'sid={sid}'
     })
+
+
+def _close_websocket(ws: ClientConnection) -> None:
+    # Read any received message before closing the socket.
+    # There seems to be a race condition that hangs close if we don't do this.
+    # Frames are read from the socket by a background thread, so the socket
+    # itself can't tell whether messages are pending: recv(timeout=0) does.
+    # It raises TimeoutError once the queue is empty, and ConnectionClosed
+    # if the server already closed the connection.
+    try:
+        while True:
+            ws.recv(timeout=0)
+    except (TimeoutError, ConnectionClosed):
+        pass
+    ws.close()
+
+
+@contextmanager
+def _connect_websocket(sid: str) -> Generator[ClientConnection, None, None]:
+    ws = _open_websocket(sid)
     try:
         yield ws
     finally:
-        # Read any received message before closing the socket.
-        # There seems to be a race condition that hangs close if we don't do this.
-        try:
-            while True:
-                ws.recv(timeout=0)
-        except:
-            pass
-        ws.close()
+        _close_websocket(ws)
+
+
+@contextmanager
+def _connect_two_websockets(
+    sid1: str,
+    sid2: str
+) -> Generator[Tuple[ClientConnection, ClientConnection], None, None]:
+    '''
+    Like _connect_websocket, but opens two websockets at once. Both handshakes
+    are performed concurrently, so their round trips overlap.
+    '''
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(_open_websocket, sid) for sid in (sid1, sid2)]
+
+    with ExitStack() as stack:
+        # Close any websocket that did open, even if the other one failed
+        for fut in futures:
+            if fut.exception() is None:
+                stack.callback(_close_websocket, fut.result())
+        yield futures[0].result(), futures[1].result()
 
 
 def test_hello(session: GeneratedSession):
@@ -46,23 +123,13 @@ def test_hello(session: GeneratedSession):
 
     with _connect_websocket(sid=session.sid) as websocket:
         # Receive and parse the hello event
-        message = HelloEvent.model_validate_json(websocket.recv(timeout=3))
-
-        # We know which rooms we have, but not the messages they've got
-        expected_rooms = [
-            ("beast", "Boost.Beast"),
-            ("async", "Boost.Async"),
-            ("db", "Database connectors"),
-            ("wasm", "Web assembly"),
-        ]
+        message = _hello_event.validate_json(websocket.recv(timeout=3))
 
         # Validate user
         assert message.payload.me.username == session.username
 
         # Validate rooms
-        for actual, (expected_id, expected_name) in zip(message.payload.rooms, expected_rooms):
-            assert actual.id == expected_id
-            assert actual.name == expected_name
+        assert [(r.id, r.name) for r in message.payload.rooms] == _expected_rooms
 
 
 def test_send_receive_messages(session: GeneratedSession, session2: GeneratedSession):
@@ -71,59 +138,43 @@ def test_send_receive_messages(session: GeneratedSession, session2: GeneratedSes
     server, we receive it back with its ID and timestamp, and other clients
     receive it, too.
     '''
-    with _connect_websocket(sid=session.sid) as ws1:
-        with _connect_websocket(sid=session2.sid) as ws2:
-            # Read hello messages
-            h1 = HelloEvent.model_validate_json(ws1.recv(timeout=1))
-            h2 = HelloEvent.model_validate_json(ws2.recv(timeout=1))
-            assert h1.payload.me.username == session.username
-            assert h2.payload.me.username == session2.username
-
-            # Send a message through ws1
-            sent_msg = ClientMessagesEvent(
-                type='clientMessages',
-                payload=ClientMessagesEventPayload(
-                    roomId="wasm",
-                    messages=[ClientMessage(
-                        content="Test message 1"
-                    )]
-                )
-            )
-            ws1.send(sent_msg.model_dump_json())
-
-            # Both ws1 and ws2 should receive it
-            ws1_msg = ServerMessagesEvent.model_validate_json(ws1.recv())
-            ws2_msg = ServerMessagesEvent.model_validate_json(ws2.recv())
-
-            # Validate one of them
-            assert len(ws1_msg.payload.messages) == 1
-            recv_msg = ws1_msg.payload.messages[0]
-            assert recv_msg.user == h1.payload.me
-            assert recv_msg.content == "Test message 1"
-
-            # The other one should be identical
-            assert ws1_msg.model_dump_json() == ws2_msg.model_dump_json()
-
-            # Send a message through ws2
-            sent_msg = ClientMessagesEvent(
-                type='clientMessages',
-                payload=ClientMessagesEventPayload(
-                    roomId="beast",
-                    messages=[ClientMessage(
-                        content="Test message 2"
-                    )]
-                )
-            )
-            ws2.send(sent_msg.model_dump_json())
-
-            # Both ws1 and ws2 should receive it
-            ws1_msg = ServerMessagesEvent.model_validate_json(ws1.recv())
-            ws2_msg = ServerMessagesEvent.model_validate_json(ws2.recv())
-
-            # Sanity checks
-            assert ws1_msg.payload.messages[0].user == h2.payload.me
-            assert ws1_msg.model_dump_json() == ws2_msg.model_dump_json()
-            assert ws1_msg.payload.roomId == 'beast'
+    with _connect_two_websockets(session.sid, session2.sid) as (ws1, ws2):
+        # Read hello messages
+        h1 = _hello_event.validate_json(ws1.recv(timeout=1))
+        h2 = _hello_event.validate_json(ws2.recv(timeout=1))
+        assert h1.payload.me.username == session.username
+        assert h2.payload.me.username == session2.username
+
+        # Send a message through ws1
+        ws1.send(_wasm_message_1)
+
+        # Both ws1 and ws2 should receive it. The server broadcasts the same
+        # serialized event to every client, so we only need to parse one of them
+        ws1_raw = ws1.recv()
+        ws2_raw = ws2.recv()
+        ws1_msg = _server_messages_event.validate_json(ws1_raw)
+
+        # Validate one of them
+        assert len(ws1_msg.payload.messages) == 1
+        recv_msg = ws1_msg.payload.messages[0]
+        assert recv_msg.user == h1.payload.me
+        assert recv_msg.content == "Test message 1"
+
+        # The other one should be identical
+        assert ws1_raw == ws2_raw
+
+        # Send a message through ws2
+        ws2.send(_beast_message_2)
+
+        # Both ws1 and ws2 should receive it
+        ws1_raw = ws1.recv()
+        ws2_raw = ws2.recv()
+        ws1_msg = _server_messages_event.validate_json(ws1_raw)
+
+        # Sanity checks
+        assert ws1_msg.payload.messages[0].user == h2.payload.me
+        assert ws1_raw == ws2_raw
+        assert ws1_msg.payload.roomId == 'beast'
 
 
 def test_new_messages_appear_in_history(session: GeneratedSession, session2: GeneratedSession):
@@ -134,37 +185,20 @@ def test_new_messages_appear_in_history(session: GeneratedSession, session2: Gen
 
     with _connect_websocket(session.sid) as ws1:
         # Read hello message
-        h1 = HelloEvent.model_validate_json(ws1.recv(timeout=1))
+        h1 = _hello_event.validate_json(ws1.recv(timeout=1))
 
         # Send a couple of messages
-        msg_1 = ClientMessagesEvent(
-            type='clientMessages',
-            payload=ClientMessagesEventPayload(
-                roomId="wasm",
-                messages=[ClientMessage(
-                    content="Test message 1"
-                )]
-            )
-        )
-        msg_2 = ClientMessagesEvent(
-            type='clientMessages',
-            payload=ClientMessagesEventPayload(
-                roomId="wasm",
-                messages=[ClientMessage(
-                    content="Test message 2"
-                )]
-            )
-        )
-        ws1.send(msg_1.model_dump_json())
-        ws1.send(msg_2.model_dump_json())
+        ws1.send(_wasm_message_1)
+        ws1.send(_wasm_message_2)
 
-        # Receive the sent messages. This guarantees that the server has received and processed them
-        ServerMessagesEvent.model_validate_json(ws1.recv())
-        ServerMessagesEvent.model_validate_json(ws1.recv())
+        # Receive the sent messages. This guarantees that the server has received and processed them.
+        # Their contents are checked by test_send_receive_messages, so we don't parse them here
+        ws1.recv()
+        ws1.recv()
 
         # Connect another websocket and read the hello
         with _connect_websocket(sid=session2.sid) as ws2:
-            h2 = HelloEvent.model_validate_json(ws2.recv(timeout=1))
+            h2 = _hello_event.validate_json(ws2.recv(timeout=1))
 
     # Validate that two new messages were added to the room's history
     wasm_room_2 = next(r for r in h2.payload.rooms if r.id == 'wasm')
@@ -174,7 +208,7 @@ def test_new_messages_appear_in_history(session: GeneratedSession, session2: Gen
     assert wasm_room_2.messages[0].user == h1.payload.me
     assert wasm_room_2.messages[1].content == 'Test message 1'
     assert wasm_room_2.messages[1].user == h1.payload.me
-    assert wasm_room_2.messages[0].id > wasm_room_2.messages[1].id
+    assert _parse_stream_id(wasm_room_2.messages[0].id) > _parse_stream_id(wasm_room_2.messages[1].id)
 
 
 def test_not_authenticated():
@@ -7,9 +7,11 @@
 #
 
 import os
+import re
 from os import path
-from typing import List, Tuple
-from abc import abstractmethod, ABCMeta
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 
 # Script to get file headers (copyright notices
 # and include guards) okay and up to date
@@ -24,6 +26,13 @@ BASE_FILES = [
     'docker-compose.yml',
     'Dockerfile'
 ]
+# Folders within BASE_FOLDERS that don't contain our sources (e.g. build
+# directories created by IDEs), and are skipped entirely
+IGNORED_FOLDERS = {
+    'build',
+    '__build',
+    '__pycache__',
+}
 
 HEADER_TEMPLATE = '''{begin}
 {linesym} Copyright (c) 2023 Ruben Perez Hidalgo (rubenperez038 at gmail dot com)
@@ -33,108 +42,116 @@ HEADER_TEMPLATE = '''{begin}
 {end}'''
 
 
-def find_first_blank(lines):
-    return [i for i, line in enumerate(lines) if line == ''][0]
+# Patterns used to locate the end of existing headers. Files are processed
+# as a single string, so these operate on lines using multiline mode
+BLANK_LINE_RE = re.compile(r'^\n', re.MULTILINE)
+DEFINE_LINE_RE = re.compile(r'^#define.*\n?', re.MULTILINE)
+XML_BLANK_LINE_RE = re.compile(r'^(?!\Z)[^\S\n]*$', re.MULTILINE)
+XML_CONTENT_LINE_RE = re.compile(r'^<(?!!--)', re.MULTILINE)
+
+def search(regex: re.Pattern, text: str, pos: int = 0) -> re.Match:
+    match = regex.search(text, pos)
+    if match is None:
+        raise ValueError(f'Could not find a line matching {regex.pattern}')
+    return match
 
 def read_file(fpath):
-    with open(fpath, 'rt') as f:
+    with open(fpath, 'rt', encoding='utf-8') as f:
         try:
-            return f.readlines()
+            return f.read()
         except Exception as err:
             raise SystemError(f'Error processing file {fpath}') from err
     
-def write_file(fpath, lines):
-    with open(fpath, 'wt') as f:
-        f.writelines(lines)
-
-def text_to_lines(text):
-    return [line + '\n' for line in text.split('\n')]
+def file_starts_with(fpath, prefix):
+    expected = prefix.encode()
+    with open(fpath, 'rb') as f:
+        return f.read(len(expected)) == expected
+    
+def write_file(fpath, text):
+    with open(fpath, 'wt', encoding='utf-8') as f:
+        f.write(text)
 
-def gen_header(linesym, opensym=None, closesym=None, shebang=None, include_guard=None):
+# Headers only depend on the arguments, so processors using the same
+# comment syntax (e.g. cpp and hpp) share a single header string
+@lru_cache(maxsize=None)
+def gen_header(linesym, opensym=None, closesym=None, shebang=None):
     opensym = linesym if opensym is None else opensym
     closesym = linesym if closesym is None else closesym
     if shebang is None:
         begin = opensym
     else:
         begin = shebang + '\n' + opensym
-    if include_guard is None:
-        end = closesym
+    return HEADER_TEMPLATE.format(begin=begin, end=closesym, linesym=linesym) + '\n'
+
+# A processor is a pair of functions:
+#   process(text, fpath) returns the file contents with an up to date header.
+#   expected_prefix(fpath) returns text such that, if the file starts with it,
+#     process() would leave it unchanged, so it doesn't need to be read.
+#     Returns None if there is no such text.
+class Processor(NamedTuple):
+    name: str
+    process: Callable[[str, str], str]
+    expected_prefix: Callable[[str], Optional[str]]
+
+def process_normal(header: str, text: str, _: str) -> str:
+    first_blank = search(BLANK_LINE_RE, text).start()
+    return header + text[first_blank:]
+
+def normal_expected_prefix(header: str, _: str) -> Optional[str]:
+    # The header followed by a blank line, which is where our header ends
+    return header + '\n'
+
+def normal_processor(name: str, header: str) -> Processor:
+    return Processor(name, partial(process_normal, header), partial(normal_expected_prefix, header))
+
+# The copyright notice is the same for all headers, only the include guard changes
+HPP_HEADER = gen_header('//')
+
+# Paths passed to gen_include_guard are always within REPO_BASE, so relative
+# paths can be obtained by slicing off these prefixes
+INCLUDE_BASE_PREFIX = path.join(REPO_BASE, 'include') + os.sep
+REPO_BASE_PREFIX = REPO_BASE + os.sep
+INCLUDE_GUARD_TRANSLATION = str.maketrans({ '/': '_', '.': '_' })
+
+def gen_include_guard(fpath):
+    if fpath.startswith(INCLUDE_BASE_PREFIX):
+        relpath = fpath[len(INCLUDE_BASE_PREFIX):]
     else:
-        end = closesym + '\n\n#ifndef {0}\n#define {0}'.format(include_guard)
-    return text_to_lines(HEADER_TEMPLATE.format(begin=begin, end=end, linesym=linesym))
+        relpath = 'servertechchat' + os.sep + fpath[len(REPO_BASE_PREFIX):]
+    return relpath.translate(INCLUDE_GUARD_TRANSLATION).upper()
 
-class BaseProcessor(metaclass=ABCMeta):
-    skip = False
+def gen_hpp_header(fpath: str) -> str:
+    iguard = gen_include_guard(fpath)
+    return f'{HPP_HEADER}\n#ifndef {iguard}\n#define {iguard}\n'
 
-    @abstractmethod
-    def process(self, lines: List[str], fpath: str) -> List[str]:
-        return lines
-    
-    name = ''
+def process_hpp(text: str, fpath: str) -> str:
+    first_content = search(DEFINE_LINE_RE, text).end()
+    return gen_hpp_header(fpath) + text[first_content:]
 
-class NormalProcessor(BaseProcessor):
-    def __init__(self, name, header):
-        self.header = header
-        self.name = name
-        
-    def process(self, lines: List[str], _: str) -> List[str]:
-        first_blank = find_first_blank(line.replace('\n', '') for line in lines)
-        lines = self.header + lines[first_blank:]
-        return lines
-        
-class HppProcessor(BaseProcessor):
-    name = 'hpp'
-    
-    def process(self, lines: List[str], fpath: str) -> List[str]:
-        first_content = [i for i, line in enumerate(lines) if line.startswith('#define')][0] + 1
-        iguard = self._gen_include_guard(fpath)
-        header = gen_header('//', include_guard=iguard)
-        lines = header + lines[first_content:]
-        return lines
-        
-        
-    @staticmethod
-    def _gen_include_guard(fpath):
-        include_base = path.join(REPO_BASE, 'include')
-        if fpath.startswith(include_base):
-            relpath = path.relpath(fpath, include_base)
-        else:
-            relpath = path.join('servertechchat', path.relpath(fpath, REPO_BASE))
-        return relpath.replace('/', '_').replace('.', '_').upper()
-
-
-class XmlProcessor(BaseProcessor):
-    name = 'xml'
-    header = gen_header('   ', '<!--', '-->')
-    
-    def process(self, lines: List[str], fpath: str) -> List[str]:
-        if lines[0].startswith('<?'):
-            first_blank = [i for i, line in enumerate(lines) if line.strip() == ''][0]
-            first_content = [i for i, line in enumerate(lines[first_blank:]) \
-                             if line.startswith('<') and not line.startswith('<!--')][0] + first_blank
-            lines = lines[0:first_blank] + ['\n'] + self.header + ['\n'] + lines[first_content:]
-        else:
-            lines = NormalProcessor('xml', self.header).process(lines, fpath)
-        
-        return lines
-        
-        
-class IgnoreProcessor(BaseProcessor):
-    name = 'ignore'
-    skip = True
-    
-    def process(self, lines: List[str], _: str) -> List[str]:
-        return lines
-        
-hash_processor = NormalProcessor('hash', gen_header('#'))
-qbk_processor = NormalProcessor('qbk', gen_header('   ', opensym='[/', closesym=']'))
-sql_processor = NormalProcessor('sql', gen_header('--'))
-cpp_processor = NormalProcessor('cpp', gen_header('//'))
-py_processor = NormalProcessor('py', gen_header('#', shebang='#!/usr/bin/python3'))
-bash_processor = NormalProcessor('bash', gen_header('#', shebang='#!/bin/bash'))
-bat_processor = NormalProcessor('bat', gen_header('@REM'))
-
-FILE_PROCESSORS : List[Tuple[str, BaseProcessor]] = [
+XML_HEADER = gen_header('   ', '<!--', '-->')
+
+def process_xml(text: str, fpath: str) -> str:
+    if text.startswith('<?'):
+        first_blank = search(XML_BLANK_LINE_RE, text).start()
+        first_content = search(XML_CONTENT_LINE_RE, text, first_blank).start()
+        return text[0:first_blank] + '\n' + XML_HEADER + '\n' + text[first_content:]
+    else:
+        return process_normal(XML_HEADER, text, fpath)
+
+hash_processor = normal_processor('hash', gen_header('#'))
+qbk_processor = normal_processor('qbk', gen_header('   ', opensym='[/', closesym=']'))
+sql_processor = normal_processor('sql', gen_header('--'))
+cpp_processor = normal_processor('cpp', gen_header('//'))
+py_processor = normal_processor('py', gen_header('#', shebang='#!/usr/bin/python3'))
+bash_processor = normal_processor('bash', gen_header('#', shebang='#!/bin/bash'))
+bat_processor = normal_processor('bat', gen_header('@REM'))
+hpp_processor = Processor('hpp', process_hpp, gen_hpp_header)
+# A file starting with our header doesn't start with <?, so it's processed
+# like in normal processors
+xml_processor = Processor('xml', process_xml, partial(normal_expected_prefix, XML_HEADER))
+
+# Files mapped to None are left untouched
+FILE_PROCESSORS : List[Tuple[str, Optional[Processor]]] = [
     ('CMakeLists.txt', hash_processor),
     ('.cmake', hash_processor),
     ('.cmake.in', hash_processor),
@@ -152,47 +169,84 @@ FILE_PROCESSORS : List[Tuple[str, BaseProcessor]] = [
     ('.dockerfile', hash_processor),
     ('.star', hash_processor),
     ('.cpp', cpp_processor),
-    ('.hpp', HppProcessor()),
-    ('.ipp', HppProcessor()),
-    ('.xml', XmlProcessor()),
-    ('.xsl', XmlProcessor()),
-    ('.svg', IgnoreProcessor()),
-    ('valgrind_suppressions.txt', IgnoreProcessor()),
-    ('.pem', IgnoreProcessor()),
-    ('.md', IgnoreProcessor()),
-    ('.csv', IgnoreProcessor()),
-    ('.tar.gz', IgnoreProcessor()),
-    ('.json', IgnoreProcessor()),
-    ('.html', IgnoreProcessor()),
+    ('.hpp', hpp_processor),
+    ('.ipp', hpp_processor),
+    ('.xml', xml_processor),
+    ('.xsl', xml_processor),
+    ('.svg', None),
+    ('valgrind_suppressions.txt', None),
+    ('.pem', None),
+    ('.md', None),
+    ('.csv', None),
+    ('.tar.gz', None),
+    ('.json', None),
+    ('.html', None),
     ('Dockerfile', hash_processor),
 ]
 
+# Lookup tables to find the processor for a file without scanning FILE_PROCESSORS.
+# Entries not starting with a dot match whole file names (e.g. CMakeLists.txt).
+# Extensions with several dots (e.g. .cmake.in) can't be obtained with splitext,
+# so they're checked by suffix. Everything else is looked up by extension.
+_PROCESSORS_BY_NAME = { ext: p for ext, p in FILE_PROCESSORS if not ext.startswith('.') }
+_PROCESSORS_BY_SUFFIX = [(ext, p) for ext, p in FILE_PROCESSORS if ext.startswith('.') and ext.count('.') > 1]
+_PROCESSORS_BY_EXT = { ext: p for ext, p in FILE_PROCESSORS if ext.startswith('.') and ext.count('.') == 1 }
+
+def find_processor(fpath: str) -> Optional[Processor]:
+    fname = path.basename(fpath)
+    if fname in _PROCESSORS_BY_NAME:
+        return _PROCESSORS_BY_NAME[fname]
+    for ext, processor in _PROCESSORS_BY_SUFFIX:
+        if fname.endswith(ext):
+            return processor
+    ext = path.splitext(fname)[1]
+    if ext in _PROCESSORS_BY_EXT:
+        return _PROCESSORS_BY_EXT[ext]
+    raise ValueError('Could not find a suitable processor for file: ' + fpath)
+
 def process_file(fpath: str):
     try:
-        for ext, processor in FILE_PROCESSORS:
-            if fpath.endswith(ext):
-                if VERBOSE:
-                    print('Processing file {} with processor {}'.format(fpath, processor.name))
-                if not processor.skip:
-                    lines = read_file(fpath)
-                    output_lines = processor.process(lines, fpath)
-                    if output_lines != lines:
-                        write_file(fpath, output_lines)
-                break
-        else:
-            raise ValueError('Could not find a suitable processor for file: ' + fpath)
+        processor = find_processor(fpath)
+        if VERBOSE:
+            print('Processing file {} with processor {}'.format(fpath, 'ignore' if processor is None else processor.name))
+        if processor is not None:
+            # Most files already have the right header. Checking just the beginning
+            # of the file avoids reading and processing it entirely
+            prefix = processor.expected_prefix(fpath)
+            if prefix is not None and file_starts_with(fpath, prefix):
+                return
+            text = read_file(fpath)
+            output = processor.process(text, fpath)
+            if output != text:
+                write_file(fpath, output)
     except:
         print(f'Error processing {fpath}')
         raise
 
-def process_all_files():
+def list_folder_files(folder: str) -> Iterator[str]:
+    # Ignored files are filtered out here, so they're never opened. Like os.walk,
+    # symlinks to directories are not followed
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink() and entry.name not in IGNORED_FOLDERS:
+                    yield from list_folder_files(entry.path)
+            elif find_processor(entry.path) is not None:
+                yield entry.path
+
+def list_all_files() -> List[str]:
+    res = []
     for base_folder in BASE_FOLDERS:
-        base_folder_abs = path.join(REPO_BASE, base_folder)
-        for curdir, _, files in os.walk(base_folder_abs):
-            for fname in files:
-                process_file(path.join(curdir, fname))
-    for fname in BASE_FILES:
-        process_file(path.join(REPO_BASE, fname))
+        res += list_folder_files(path.join(REPO_BASE, base_folder))
+    res += [path.join(REPO_BASE, fname) for fname in BASE_FILES]
+    return res
+
+def process_all_files():
+    # Files are independent from each other, and processing them is I/O bound,
+    # so we can process them concurrently. Consuming the results propagates any error
+    with ThreadPoolExecutor() as executor:
+        for _ in executor.map(process_file, list_all_files()):
+            pass
 
 
 def main():